@@ -1,10 +1,13 @@
 """Gemini チャットボット - Streamlit アプリケーション"""
 
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import streamlit as st
 
+from src import document_store
 from src.chat import GeminiChat
 from src.document_loader import DocumentLoader
 
@@ -19,22 +22,91 @@ st.set_page_config(
 )
 
 
-def load_preset_documents(chat: GeminiChat, loader: DocumentLoader):
-    """docs/ フォルダから事前登録ドキュメントを読み込み"""
+@st.cache_resource
+def get_loader() -> DocumentLoader:
+    """DocumentLoader を全セッションで共有"""
+    return DocumentLoader()
+
+
+# 解析結果の本文はディスク（document_store）に置き、キャッシュにはハッシュだけを持つ
+@st.cache_data(show_spinner=False)
+def parse_bytes_to_store(data: bytes, name: str) -> str:
+    """アップロードされたバイトデータを解析して保存（同じ内容なら再解析しない）"""
+    return document_store.save(get_loader().load(data, name))
+
+
+@st.cache_data(show_spinner=False)
+def parse_preset_to_store(path: str, mtime: float, size: int) -> str:
+    """事前登録ファイルを解析して保存（パス・更新日時・サイズが同じなら再解析しない）"""
+    with open(path, "rb") as f:
+        return document_store.save(get_loader().load(f.read(), Path(path).name))
+
+
+def parse_bytes(data: bytes, name: str) -> str:
+    """アップロードされたバイトデータの解析結果を取得"""
+    try:
+        return document_store.load(parse_bytes_to_store(data, name))
+    except FileNotFoundError:
+        # 保存ファイルが消されていたら解析し直す
+        return get_loader().load(data, name)
+
+
+def parse_preset_file(path: str, mtime: float, size: int) -> str:
+    """事前登録ファイルの解析結果を取得"""
+    try:
+        return document_store.load(parse_preset_to_store(path, mtime, size))
+    except FileNotFoundError:
+        # 保存ファイルが消されていたら解析し直す
+        with open(path, "rb") as f:
+            return get_loader().load(f.read(), Path(path).name)
+
+
+def load_preset_documents(chat: GeminiChat) -> bool:
+    """
+    docs/ フォルダから事前登録ドキュメントを読み込み
+
+    Returns:
+        登録に成功した（または登録するものがなかった）場合 True
+    """
     if not DOCS_DIR.exists():
-        return
+        return True
 
     supported_extensions = {".pdf", ".txt", ".md", ".csv"}
 
-    for file_path in DOCS_DIR.iterdir():
-        if file_path.suffix.lower() in supported_extensions:
-            if file_path.name not in chat.get_document_list():
-                try:
-                    with open(file_path, "rb") as f:
-                        content = loader.load(f.read(), file_path.name)
-                    chat.add_document(f"[preset] {file_path.name}", content)
-                except Exception:
-                    pass  # 読み込み失敗は無視
+    paths = [
+        file_path
+        for file_path in DOCS_DIR.iterdir()
+        if file_path.suffix.lower() in supported_extensions
+        and not chat.has_document(f"[preset] {file_path.name}")
+    ]
+    if not paths:
+        return True
+
+    def _parse_one(file_path: Path) -> tuple[str, str]:
+        stat = file_path.stat()
+        content = parse_preset_file(str(file_path), stat.st_mtime, stat.st_size)
+        return f"[preset] {file_path.name}", content
+
+    # 全ファイルを並列に読み込んでから、埋め込みをまとめて計算する
+    # （一覧の並びを保つため、結果は投入順に受け取る）
+    documents = {}
+    max_workers = min(8, (os.cpu_count() or 1) * 2, len(paths))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_parse_one, p) for p in paths]
+        for future in futures:
+            try:
+                name, content = future.result()
+                documents[name] = content
+            except Exception:
+                pass  # 読み込み失敗は無視
+
+    if documents:
+        try:
+            chat.add_documents(documents)
+        except Exception as e:
+            st.warning(f"⚠️ 事前登録ドキュメントを読み込めませんでした: {e}")
+            return False
+    return True
 
 
 def init_session_state():
@@ -49,13 +121,14 @@ def init_session_state():
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
-    if "loader" not in st.session_state:
-        st.session_state.loader = DocumentLoader()
+    if "uploaded_ids" not in st.session_state:
+        st.session_state.uploaded_ids = set()  # 処理済みアップロードの file_id
 
     # 事前登録ドキュメントを読み込み
     if "preset_loaded" not in st.session_state and st.session_state.chat:
-        load_preset_documents(st.session_state.chat, st.session_state.loader)
-        st.session_state.preset_loaded = True
+        # 登録に失敗した場合は次回の再実行で再試行する
+        if load_preset_documents(st.session_state.chat):
+            st.session_state.preset_loaded = True
 
 
 def main():
@@ -87,35 +160,51 @@ def main():
         # アップロードされたファイルを処理
         if uploaded_files:
             for file in uploaded_files:
-                if file.name not in st.session_state.chat.get_document_list():
+                # 処理済みのファイルはバイトデータに触れずスキップ
+                if file.file_id in st.session_state.uploaded_ids:
+                    continue
+                st.session_state.uploaded_ids.add(file.file_id)
+                if not st.session_state.chat.has_document(file.name):
                     try:
-                        content = st.session_state.loader.load(
-                            file.read(), file.name
-                        )
-                        st.session_state.chat.add_document(file.name, content)
+                        data = file.getvalue()
+                        # 同じ内容のファイルが登録済みなら解析・埋め込みを省略
+                        source_hash = hashlib.sha256(data).hexdigest()
+                        if not st.session_state.chat.add_alias(file.name, source_hash):
+                            content = parse_bytes(data, file.name)
+                            st.session_state.chat.add_document(
+                                file.name, content, source_hash=source_hash
+                            )
                         st.success(f"✅ {file.name}")
                     except Exception as e:
                         st.error(f"❌ {file.name}: {e}")
 
         st.divider()
 
-        # URL入力
-        url_input = st.text_input(
+        # URL入力（1行に1つ、複数可）
+        url_input = st.text_area(
             "URLを追加:",
             placeholder="https://example.com",
-            help="Webページの内容を取得します",
+            help="Webページの内容を取得します（1行に1つ、複数のURLをまとめて追加できます）",
         )
-
-        if st.button("URLを追加", disabled=not url_input):
-            if url_input:
+        urls = [line.strip() for line in url_input.splitlines() if line.strip()]
+
+        if st.button("URLを追加", disabled=not urls):
+            results = get_loader().load_many(urls)
+            documents = {}
+            for url, content in results.items():
+                if isinstance(content, Exception):
+                    st.error(f"❌ 取得失敗: {url}: {content}")
+                    continue
+                # URLを短縮してファイル名として使用
+                short_name = url[:50] + "..." if len(url) > 50 else url
+                documents[short_name] = content
+
+            if documents:
                 try:
-                    content = st.session_state.loader.load(url_input)
-                    # URLを短縮してファイル名として使用
-                    short_name = url_input[:50] + "..." if len(url_input) > 50 else url_input
-                    st.session_state.chat.add_document(short_name, content)
-                    st.success(f"✅ URLを追加しました")
+                    st.session_state.chat.add_documents(documents)
+                    st.success(f"✅ URLを{len(documents)}件追加しました")
                 except Exception as e:
-                    st.error(f"❌ 取得失敗: {e}")
+                    st.error(f"❌ 追加失敗: {e}")
 
         st.divider()
 
@@ -157,9 +246,7 @@ def main():
 
         # アシスタントの回答を生成
         with st.chat_message("assistant"):
-            with st.spinner("考え中..."):
-                response = st.session_state.chat.generate(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.chat.generate_stream(prompt))
 
         # アシスタントメッセージを追加
         st.session_state.messages.append({"role": "assistant", "content": response})
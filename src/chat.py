@@ -1,7 +1,26 @@
 """Gemini チャットモジュール"""
 
+from collections.abc import Iterator
+
 import google.generativeai as genai
 
+from src import document_store
+from src.response_cache import SemanticCache
+from src.retriever import DocumentIndex
+
+# システム指示（モデル側に一度だけ設定し、毎ターンは送らない）
+SYSTEM_INSTRUCTION = """あなたは親切で知識豊富なアシスタントです。
+各メッセージの「参考」に示すドキュメントの内容を参考に、ユーザーの質問に日本語で回答してください。
+
+## ルール
+- ドキュメントの内容に基づいて正確に回答してください
+- ドキュメントに情報がない場合は、その旨を伝えてください
+- 回答は分かりやすく、簡潔にしてください
+- 必要に応じて箇条書きや見出しを使ってください"""
+
+# 会話履歴として保持する直近のターン数
+MAX_HISTORY_TURNS = 10
+
 
 class GeminiChat:
     """Gemini APIを使用したチャットクラス"""
@@ -15,32 +34,153 @@ class GeminiChat:
             model_name: 使用するモデル名
         """
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        self.documents: dict[str, str] = {}  # filename -> content
-
-    def add_document(self, filename: str, content: str) -> None:
+        self.model = genai.GenerativeModel(
+            model_name, system_instruction=SYSTEM_INSTRUCTION
+        )
+        # filename -> (sha256, 文字数)：本文はディスクに置き、メモリには持たない
+        self.documents: dict[str, tuple[str, int]] = {}
+        self.index = DocumentIndex()
+        self._qcache = SemanticCache()
+        self._corpus_version = 0  # ドキュメント構成が変わるたびに更新
+        # 直前に組み立てたコンテキスト（同じ検索結果なら再利用）
+        self._context_key: tuple[int, tuple[int, ...]] | None = None
+        self._context_cache: str | None = None
+        # 元ファイルのハッシュによる重複排除
+        self._source_hash: dict[str, str] = {}  # filename -> 元ファイルの sha256
+        self._by_hash: dict[str, str] = {}  # 元ファイルの sha256 -> 索引済みの filename
+        # 会話履歴（質問と回答のみ。参考チャンクは含めない）
+        # ドキュメント構成が変わったらリセットする
+        self._history: list[dict] = []
+        self._history_version = 0
+
+    def add_document(
+        self, filename: str, content: str, source_hash: str | None = None
+    ) -> None:
         """
         ドキュメントを追加
 
         Args:
             filename: ファイル名
             content: ドキュメントの内容
+            source_hash: 元ファイル（バイトデータ）の sha256（重複排除に使用）
+        """
+        self.add_documents({filename: content})
+        if source_hash:
+            self._source_hash[filename] = source_hash
+            self._by_hash.setdefault(source_hash, filename)
+
+    def add_alias(self, filename: str, source_hash: str) -> bool:
+        """
+        同じ内容のファイルが登録済みなら、解析・埋め込みをせずに別名で登録
+
+        Args:
+            filename: ファイル名
+            source_hash: 元ファイル（バイトデータ）の sha256
+
+        Returns:
+            別名で登録できた（または登録済みだった）場合 True
+        """
+        canonical = self._by_hash.get(source_hash)
+        if canonical is None:
+            return False
+        if filename == canonical:
+            return True
+
+        if filename in self.documents:
+            self._discard(filename)
+        self.documents[filename] = self.documents[canonical]
+        self._source_hash[filename] = source_hash
+        self._invalidate()
+        return True
+
+    def add_documents(self, documents: dict[str, str]) -> None:
         """
-        self.documents[filename] = content
+        複数のドキュメントをまとめて追加（埋め込みAPIの呼び出しを集約）
+
+        Args:
+            documents: ファイル名 -> ドキュメントの内容
+        """
+        entries = [
+            (filename, document_store.save(content), content)
+            for filename, content in documents.items()
+        ]
+        # 先に埋め込みを済ませ、失敗しても既存のドキュメントは残す
+        embedded = self.index.embed_documents(entries)
+
+        try:
+            for filename, _, _ in entries:
+                if filename in self.documents:
+                    self._discard(filename)
+            self.index.add_embedded(*embedded)
+            for filename, sha, content in entries:
+                self.documents[filename] = (sha, len(content))
+        finally:
+            self._invalidate()
 
     def remove_document(self, filename: str) -> None:
         """ドキュメントを削除"""
         if filename in self.documents:
-            del self.documents[filename]
+            self._discard(filename)
+            self._invalidate()
+
+    def _discard(self, filename: str) -> None:
+        """ドキュメントを登録から外す（別名が残っていればチャンクを引き継ぐ）"""
+        del self.documents[filename]
+        source_hash = self._source_hash.pop(filename, None)
+        if source_hash is not None:
+            if self._by_hash.get(source_hash) != filename:
+                return  # 別名はチャンクを持たない
+
+            heir = next(
+                (name for name, h in self._source_hash.items() if h == source_hash),
+                None,
+            )
+            if heir is not None:
+                self.index.rename(filename, heir)
+                self._by_hash[source_hash] = heir
+                return
+            del self._by_hash[source_hash]
+
+        self.index.remove(filename)
 
     def clear_documents(self) -> None:
         """全ドキュメントをクリア"""
         self.documents.clear()
+        self._source_hash.clear()
+        self._by_hash.clear()
+        self.index.clear()
+        self._qcache.clear()
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        """ドキュメント構成の変更を反映（回答・コンテキストのキャッシュを無効化）"""
+        self._corpus_version += 1
+        self._context_key = None
+        self._context_cache = None
 
     def get_document_list(self) -> list[str]:
         """ドキュメント一覧を取得"""
         return list(self.documents.keys())
 
+    def has_document(self, filename: str) -> bool:
+        """ドキュメントが登録済みか確認"""
+        return filename in self.documents
+
+    def _build_context(self, chunk_ids: list[int]) -> str:
+        """検索結果のチャンクからコンテキストを構築（同じ結果ならキャッシュを返す）"""
+        key = (self._corpus_version, tuple(chunk_ids))
+        if key != self._context_key:
+            context_parts = []
+            for i in chunk_ids:
+                try:
+                    filename, chunk = self.index.get_chunk(i)
+                except FileNotFoundError:
+                    continue  # 長期間使われず掃除された本文は読み飛ばす
+                context_parts.append(f"=== {filename} ===\n{chunk}")
+            self._context_cache = "\n\n".join(context_parts)
+            self._context_key = key
+        return self._context_cache
+
     def generate(self, query: str) -> str:
         """
         ユーザーの質問に回答を生成
@@ -51,36 +191,65 @@ class GeminiChat:
         Returns:
             生成された回答
         """
-        if not self.documents:
-            return "ドキュメントがアップロードされていません。サイドバーからファイルをアップロードしてください。"
-
-        # コンテキストを構築
-        context_parts = []
-        for filename, content in self.documents.items():
-            context_parts.append(f"=== {filename} ===\n{content}")
-
-        context = "\n\n".join(context_parts)
-
-        # プロンプトを構築
-        prompt = f"""あなたは親切で知識豊富なアシスタントです。
-以下のドキュメントの内容を参考に、ユーザーの質問に日本語で回答してください。
-
-## ルール
-- ドキュメントの内容に基づいて正確に回答してください
-- ドキュメントに情報がない場合は、その旨を伝えてください
-- 回答は分かりやすく、簡潔にしてください
-- 必要に応じて箇条書きや見出しを使ってください
+        return "".join(self.generate_stream(query))
 
-## ドキュメント
-{context}
+    def generate_stream(self, query: str) -> Iterator[str]:
+        """
+        ユーザーの質問への回答を生成しながら少しずつ返す
 
-## ユーザーの質問
-{query}
+        Args:
+            query: ユーザーの質問
 
-## 回答"""
+        Yields:
+            生成された回答の断片
+        """
+        if not self.documents:
+            yield "ドキュメントがアップロードされていません。サイドバーからファイルをアップロードしてください。"
+            return
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            query_vec = self.index.embed_query(query)
+        except Exception as e:
+            yield f"エラーが発生しました: {str(e)}"
+            return
+
+        if self._history_version != self._corpus_version:
+            self._history = []
+            self._history_version = self._corpus_version
+
+        # 似た質問への回答が同じドキュメント構成でキャッシュされていれば再利用
+        # （保存・検索とも全ターンが対象で、判定は質問の類似度のみ。会話履歴は考慮しない）
+        cached = self._qcache.lookup(query_vec, self._corpus_version)
+        if cached is not None:
+            # モデル側の履歴も画面の会話と揃える
+            self._append_history(query, cached)
+            yield cached
+            return
+
+        # 質問に関連するチャンクだけでコンテキストを構築
+        context = self._build_context(self.index.search(query_vec, k=8))
+
+        # 参考チャンクは今回のメッセージにだけ付け、履歴には質問と回答だけを残す
+        # （過去ターンの参考チャンクを毎回送り直さないように）
+        session = self.model.start_chat(history=list(self._history))
+        message = f"## 参考\n{context}\n\n## 質問\n{query}"
+
+        version = self._corpus_version
+        parts = []
+        try:
+            for chunk in session.send_message(message, stream=True):
+                parts.append(chunk.text)
+                yield chunk.text
         except Exception as e:
-            return f"エラーが発生しました: {str(e)}"
+            yield f"エラーが発生しました: {str(e)}"
+            return
+
+        response = "".join(parts)
+        self._append_history(query, response)
+        self._qcache.store(query_vec, version, response)
+
+    def _append_history(self, query: str, response: str) -> None:
+        """会話履歴に1ターン追加し、直近 MAX_HISTORY_TURNS ターンだけ残す"""
+        self._history.append({"role": "user", "parts": [query]})
+        self._history.append({"role": "model", "parts": [response]})
+        del self._history[: -MAX_HISTORY_TURNS * 2]
@@ -2,18 +2,44 @@
 
 import csv
 import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Union
 
 import pandas as pd
+import pypdfium2 as pdfium
 import requests
-from bs4 import BeautifulSoup
-from PyPDF2 import PdfReader
+from charset_normalizer import from_bytes
+from selectolax.lexbor import LexborHTMLParser
+
+from src.retriever import CHUNK_SIZE
+
+# PDFium はスレッドセーフではないため、全ての呼び出しをこのロックで直列化する
+# （別ドキュメントであっても複数スレッドから同時に呼べない）
+_PDFIUM_LOCK = threading.Lock()
+
+# 文字コード推定で優先する候補（日本語と西欧圏）
+# 短いテキストでは推定の候補を絞らないと Shift-JIS が cp949/big5、
+# Latin-1 が utf_16 などと誤判定されやすい
+_PREFERRED_ENCODINGS = ["cp932", "euc_jp", "iso2022_jp", "cp1252"]
+
+# 取得するWebページの最大サイズ（バイト）
+MAX_WEB_BYTES = 5 * 1024 * 1024
 
 
 class DocumentLoader:
     """各種ドキュメント形式からテキストを抽出するクラス"""
 
+    def __init__(self):
+        """初期化"""
+        # 同じホストへの接続（TLSハンドシェイク）を使い回す
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+
     def load(self, source: Union[str, bytes], filename: str = "") -> str:
         """
         ファイルまたはURLからテキストを抽出
@@ -41,6 +67,28 @@ class DocumentLoader:
 
         raise ValueError(f"Unsupported source type: {type(source)}")
 
+    def load_many(self, urls: list[str]) -> dict[str, Union[str, Exception]]:
+        """
+        複数のURLを並列に取得してテキストを抽出
+
+        Args:
+            urls: 取得するURLのリスト
+
+        Returns:
+            URL -> 抽出されたテキスト（取得に失敗した場合は例外）
+        """
+        def _load_one(url: str) -> Union[str, Exception]:
+            try:
+                return self.load(url)
+            except Exception as e:
+                return e
+
+        if not urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+            return dict(zip(urls, executor.map(_load_one, urls)))
+
     def _load_file(self, path: str, ext: str) -> str:
         """ファイルパスから読み込み"""
         with open(path, "rb") as f:
@@ -63,47 +111,148 @@ class DocumentLoader:
 
     def _load_pdf(self, data: bytes) -> str:
         """PDFからテキスト抽出"""
-        reader = PdfReader(io.BytesIO(data))
+        # PDFium（C++実装）でページごとにテキストを抽出
+        # ページ・テキストページもロック内で明示的に閉じ、GC による解放を他スレッドで起こさない
         texts = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                texts.append(text)
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(data)
+            try:
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    try:
+                        text = textpage.get_text_range()
+                    finally:
+                        textpage.close()
+                        page.close()
+                    if text:
+                        texts.append(text)
+            finally:
+                pdf.close()
         return "\n".join(texts)
 
-    def _load_text(self, data: bytes) -> str:
-        """テキスト/Markdownファイルを読み込み"""
-        # UTF-8を試し、失敗したらcp932（日本語Windows）を試す
-        for encoding in ["utf-8", "cp932", "shift_jis"]:
+    def _decode(self, data: bytes) -> tuple[str, str]:
+        """
+        文字コードを判定してデコード（テキスト・CSV共通の判定順）
+
+        Returns:
+            (デコードしたテキスト, 判定した文字コード)
+        """
+        # BOM付きUTF-8（不正なバイトがあれば以降の判定に回す）
+        if data[:3] == b"\xef\xbb\xbf":
             try:
-                return data.decode(encoding)
+                return data[3:].decode("utf-8"), "utf-8-sig"
             except UnicodeDecodeError:
-                continue
-        return data.decode("utf-8", errors="ignore")
+                pass
+
+        # 大半を占めるUTF-8は推定せずにそのままデコード
+        try:
+            return data.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            pass
+
+        # それ以外は日本語・西欧圏の候補に絞って推定し、該当しなければ全候補から推定
+        best = from_bytes(data, cp_isolation=_PREFERRED_ENCODINGS).best()
+        if best is None:
+            best = from_bytes(data).best()
+        if best is not None:
+            return str(best), best.encoding
+        return data.decode("utf-8", errors="ignore"), "utf-8"
+
+    def _load_text(self, data: bytes) -> str:
+        """テキスト/Markdownファイルを読み込み"""
+        return self._decode(data)[0]
 
     def _load_csv(self, data: bytes) -> str:
         """CSVをテキストとして読み込み"""
-        text = self._load_text(data)
-        df = pd.read_csv(io.StringIO(text))
-        # DataFrameを読みやすい形式に変換
-        return df.to_markdown(index=False)
+        # 文字列へのデコードを挟まず、判定した文字コードで pandas にバイト列を直接渡す
+        # 型推定は不要なので全列を文字列として読む
+        df = pd.read_csv(
+            io.BytesIO(data),
+            encoding=self._decode(data)[1],
+            encoding_errors="replace",
+            dtype=str,
+            keep_default_na=False,
+        )
+        # パディングのないCSV形式で出力し、ヘッダー付きの行ブロックを空行で区切る
+        # （チャンク分割で各ブロックが列名を保ったまま切り出されるように）
+        if len(df) == 0:
+            return df.to_csv(index=False).strip()
+
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+
+        def _format(row) -> str:
+            # セル内の空行は段落区切りと区別できないため1行にまとめる
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(re.sub(r"\n\s*\n", "\n", str(v)) for v in row)
+            return buf.getvalue().rstrip("\n")
+
+        header = _format(df.columns)
+        # ヘッダーを除いて1ブロックに入る行の文字数
+        # （ヘッダー自体がチャンクより長い場合は split_chunks の固定長分割になる）
+        budget = max(CHUNK_SIZE - len(header) - 1, 1)
+
+        blocks = []
+        lines = []
+        size = 0
+        for row in df.itertuples(index=False, name=None):
+            line = _format(row)
+            # 1行だけで収まらない行は、ヘッダー付きの断片に分けて単独のブロックにする
+            if len(line) > budget:
+                if lines:
+                    blocks.append("\n".join([header, *lines]))
+                    lines, size = [], 0
+                blocks.extend(
+                    f"{header}\n{line[start : start + budget]}"
+                    for start in range(0, len(line), budget)
+                )
+                continue
+
+            # 目安文字数に収まる限り同じブロックに詰める
+            if lines and size + 1 + len(line) > budget:
+                blocks.append("\n".join([header, *lines]))
+                lines, size = [], 0
+            lines.append(line)
+            size += len(line) + (1 if size else 0)
+        if lines:
+            blocks.append("\n".join([header, *lines]))
+        return "\n\n".join(blocks)
 
     def _load_web(self, url: str) -> str:
         """WebページからテキストG抽出"""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        with self.session.get(url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+
+            # 巨大なページは本文をダウンロードする前に打ち切る
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > MAX_WEB_BYTES:
+                raise ValueError(
+                    f"Page too large: {length} bytes (limit {MAX_WEB_BYTES})"
+                )
+
+            # Content-Length がない（chunked）・圧縮されている場合に備え、
+            # 展開後のサイズを数えながら読み込む
+            body = bytearray()
+            for block in response.iter_content(chunk_size=64 * 1024):
+                body.extend(block)
+                if len(body) > MAX_WEB_BYTES:
+                    raise ValueError(f"Page too large (limit {MAX_WEB_BYTES} bytes)")
+            try:
+                html = body.decode(response.encoding or "utf-8", errors="replace")
+            except LookupError:
+                html = body.decode("utf-8", errors="replace")
 
-        soup = BeautifulSoup(response.text, "html.parser")
+        tree = LexborHTMLParser(html)
 
         # 不要な要素を削除
-        for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-            tag.decompose()
+        for selector in ("script", "style", "nav", "footer", "header", "aside"):
+            for node in tree.css(selector):
+                node.decompose()
 
         # テキストを抽出
-        text = soup.get_text(separator="\n", strip=True)
+        root = tree.body or tree.root
+        text = root.text(separator="\n", strip=True) if root else ""
 
         # 空行を整理
         lines = [line.strip() for line in text.split("\n") if line.strip()]
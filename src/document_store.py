@@ -0,0 +1,140 @@
+"""ドキュメント本文のディスク保存モジュール"""
+
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+
+# 本文の保存先
+DOCS_CACHE_DIR = Path(__file__).parent.parent / ".cache" / "docs"
+
+# 保存ファイルの上限（最後に使われてからの秒数・合計バイト数）
+MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+MAX_TOTAL_BYTES = 1024 * 1024 * 1024
+
+# 掃除を行う間隔（秒）
+SWEEP_INTERVAL = 60 * 60
+
+_last_sweep = 0.0
+
+
+def _doc_path(sha: str) -> Path:
+    """ハッシュから保存ファイルのパスを決定"""
+    return DOCS_CACHE_DIR / f"{sha}.txt"
+
+
+def _touch(path: Path) -> None:
+    """最終使用時刻（mtime）を更新し、掃除の対象から外す"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def sweep(
+    max_age: float = MAX_AGE_SECONDS, max_total_bytes: int = MAX_TOTAL_BYTES
+) -> None:
+    """
+    古い保存ファイルを削除
+
+    最後に使われてから max_age 秒を過ぎたファイルを消し、
+    それでも合計が max_total_bytes を超える場合は使われていない順に消す
+
+    Args:
+        max_age: 保持する秒数
+        max_total_bytes: 保持する合計バイト数
+    """
+    now = time.time()
+    files = []
+    for path in DOCS_CACHE_DIR.glob("*"):
+        try:
+            stat = path.stat()
+            # 書きかけのまま残った一時ファイルも片付ける
+            stale = max_age if path.suffix == ".txt" else SWEEP_INTERVAL
+            if now - stat.st_mtime > stale:
+                path.unlink()
+            elif path.suffix == ".txt":
+                files.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_total_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except OSError:
+            continue
+
+
+def _maybe_sweep() -> None:
+    """前回から SWEEP_INTERVAL 秒以上経っていれば掃除"""
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep >= SWEEP_INTERVAL:
+        _last_sweep = now
+        sweep()
+
+
+def save(content: str) -> str:
+    """
+    ドキュメント本文をUTF-8で保存（同じ内容は1回だけ書き込む）
+
+    Args:
+        content: ドキュメントの内容
+
+    Returns:
+        本文の SHA-256 ハッシュ
+    """
+    data = content.encode("utf-8")
+    sha = hashlib.sha256(data).hexdigest()
+    _maybe_sweep()
+
+    path = _doc_path(sha)
+    if path.exists():
+        _touch(path)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+    return sha
+
+
+def load(sha: str) -> str:
+    """
+    保存した本文を読み込み
+
+    Args:
+        sha: save が返したハッシュ
+
+    Returns:
+        ドキュメントの内容
+    """
+    path = _doc_path(sha)
+    text = path.read_bytes().decode("utf-8")
+    _touch(path)
+    return text
+
+
+def read_range(sha: str, start: int, end: int) -> str:
+    """
+    保存した本文の一部だけを読み込み
+
+    Args:
+        sha: save が返したハッシュ
+        start: 開始位置（バイト）
+        end: 終了位置（バイト）
+
+    Returns:
+        指定範囲のテキスト
+    """
+    path = _doc_path(sha)
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="ignore")
+    _touch(path)
+    return text
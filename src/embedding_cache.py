@@ -0,0 +1,96 @@
+"""埋め込みベクトルのディスクキャッシュモジュール"""
+
+import hashlib
+import uuid
+from pathlib import Path
+
+import google.generativeai as genai
+import numpy as np
+
+# キャッシュの保存先
+CACHE_DIR = Path(__file__).parent.parent / ".cache" / "emb"
+
+# 1リクエストあたりの最大テキスト数（batchEmbedContents の上限）
+BATCH_SIZE = 100
+
+
+def _cache_path(text: str, model_id: str, task_type: str) -> Path:
+    """テキストとモデルからキャッシュファイルのパスを決定"""
+    key = f"{model_id}\0{task_type}\0{text}"
+    h = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return CACHE_DIR / f"{h}.npy"
+
+
+def _embed(texts: list[str], model_id: str, task_type: str) -> list[np.ndarray]:
+    """埋め込みAPIを BATCH_SIZE 件ずつまとめて呼び出し"""
+    vectors = []
+    for start in range(0, len(texts), BATCH_SIZE):
+        result = genai.embed_content(
+            model=model_id,
+            content=texts[start : start + BATCH_SIZE],
+            task_type=task_type,
+        )
+        vectors.extend(np.asarray(v, dtype="float32") for v in result["embedding"])
+    return vectors
+
+
+def _save(path: Path, vector: np.ndarray) -> None:
+    """ベクトルを保存（失敗してもキャッシュなしで動作を継続）"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 一時ファイルに書いてから置き換え、書きかけのファイルを残さない
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, vector)
+        tmp.replace(path)
+    except OSError:
+        pass
+
+
+def get_or_compute_many(
+    texts: list[str], model_id: str, task_type: str = "retrieval_document"
+) -> list[np.ndarray]:
+    """
+    複数テキストの埋め込みを取得（キャッシュになければまとめて計算して保存）
+
+    Args:
+        texts: 埋め込むテキストのリスト
+        model_id: 埋め込みモデル名
+        task_type: 埋め込みのタスク種別
+
+    Returns:
+        texts と同じ順序の埋め込みベクトルのリスト
+    """
+    paths = [_cache_path(text, model_id, task_type) for text in texts]
+    vectors: list[np.ndarray | None] = []
+    for path in paths:
+        try:
+            vectors.append(np.load(path))
+        except (OSError, ValueError, EOFError):
+            vectors.append(None)
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        computed = _embed([texts[i] for i in missing], model_id, task_type)
+        for i, vector in zip(missing, computed):
+            _save(paths[i], vector)
+            vectors[i] = vector
+
+    return vectors
+
+
+def get_or_compute(
+    text: str, model_id: str, task_type: str = "retrieval_document"
+) -> np.ndarray:
+    """
+    テキストの埋め込みを取得（キャッシュになければ計算して保存）
+
+    Args:
+        text: 埋め込むテキスト
+        model_id: 埋め込みモデル名
+        task_type: 埋め込みのタスク種別
+
+    Returns:
+        埋め込みベクトル
+    """
+    return get_or_compute_many([text], model_id, task_type)[0]
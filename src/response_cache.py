@@ -0,0 +1,100 @@
+"""質問の類似度による回答キャッシュモジュール"""
+
+import time
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """言い換えられた質問にも過去の回答を返すセマンティックキャッシュ"""
+
+    def __init__(
+        self, threshold: float = 0.85, ttl: float = 300.0, max_size: int = 256
+    ):
+        """
+        初期化
+
+        Args:
+            threshold: キャッシュヒットとみなすコサイン類似度
+            ttl: エントリの有効期間（秒）
+            max_size: 保持する最大エントリ数（超えたら最も古く使われたものを削除）
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.index: faiss.IndexFlatIP | None = None
+        # (emb, response, ts, corpus_version, last_used)
+        self.entries: list[tuple[np.ndarray, str, float, int, float]] = []
+
+    def _rebuild(self) -> None:
+        """エントリからインデックスを再構築"""
+        if not self.entries:
+            self.index = None
+            return
+        vectors = np.vstack([entry[0] for entry in self.entries])
+        self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)
+
+    def _purge(self, version: int) -> None:
+        """期限切れ・別バージョンのコーパスに対するエントリを削除"""
+        now = time.time()
+        alive = [
+            entry
+            for entry in self.entries
+            if entry[3] == version and now - entry[2] < self.ttl
+        ]
+        if len(alive) != len(self.entries):
+            self.entries = alive
+            self._rebuild()
+
+    def lookup(self, query_vec: np.ndarray, version: int) -> str | None:
+        """
+        類似した質問の回答を検索
+
+        Args:
+            query_vec: L2正規化済みの質問ベクトル（1 x dim）
+            version: 現在のドキュメント構成のバージョン
+
+        Returns:
+            キャッシュされた回答（ヒットしなければ None）
+        """
+        self._purge(version)
+        if self.index is None:
+            return None
+
+        scores, ids = self.index.search(query_vec, 1)
+        i = int(ids[0][0])
+        if i < 0 or scores[0][0] < self.threshold:
+            return None
+
+        emb, response, ts, entry_version, _ = self.entries[i]
+        self.entries[i] = (emb, response, ts, entry_version, time.time())
+        return response
+
+    def store(self, query_vec: np.ndarray, version: int, response: str) -> None:
+        """
+        回答をキャッシュに追加
+
+        Args:
+            query_vec: L2正規化済みの質問ベクトル（1 x dim）
+            version: 現在のドキュメント構成のバージョン
+            response: 生成された回答
+        """
+        now = time.time()
+        self.entries.append((query_vec, response, now, version, now))
+
+        if len(self.entries) > self.max_size:
+            # 最も長く使われていないエントリを削除
+            lru = min(range(len(self.entries)), key=lambda i: self.entries[i][4])
+            del self.entries[lru]
+            self._rebuild()
+        elif self.index is None:
+            self._rebuild()
+        else:
+            self.index.add(query_vec)
+
+    def clear(self) -> None:
+        """キャッシュを空にする"""
+        self.index = None
+        self.entries = []
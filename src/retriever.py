@@ -0,0 +1,226 @@
+"""ドキュメント検索モジュール"""
+
+import re
+
+import faiss
+import google.generativeai as genai
+import numpy as np
+
+from src import document_store
+from src.embedding_cache import get_or_compute_many
+
+# 埋め込みモデル
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# 1チャンクあたりの目安文字数（日本語ではおおよそトークン数に相当）
+CHUNK_SIZE = 500
+
+
+def split_chunks(content: str, chunk_size: int = CHUNK_SIZE) -> list[tuple[int, int]]:
+    """
+    テキストを段落単位でチャンクに分割
+
+    Args:
+        content: 分割するテキスト
+        chunk_size: 1チャンクあたりの目安文字数
+
+    Returns:
+        各チャンクの (開始位置, 終了位置)（文字単位、content[start:end] が本文）
+    """
+    # 空行で区切られた段落の範囲（前後の空白を除く）
+    bounds = [0]
+    for match in re.finditer(r"\n\s*\n", content):
+        bounds.extend(match.span())
+    bounds.append(len(content))
+
+    paragraphs = []
+    for start, end in zip(bounds[::2], bounds[1::2]):
+        text = content[start:end]
+        stripped = text.strip()
+        if stripped:
+            start += len(text) - len(text.lstrip())
+            paragraphs.append((start, start + len(stripped)))
+
+    spans = []
+    current: tuple[int, int] | None = None
+    for start, end in paragraphs:
+        # 長すぎる段落は固定長で分割
+        while end - start > chunk_size:
+            if current:
+                spans.append(current)
+                current = None
+            spans.append((start, start + chunk_size))
+            start += chunk_size
+
+        if current and end - current[0] > chunk_size:
+            spans.append(current)
+            current = (start, end)
+        else:
+            current = (current[0], end) if current else (start, end)
+
+    if current:
+        spans.append(current)
+    return spans
+
+
+def _byte_spans(content: str, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """文字単位の範囲をUTF-8のバイト単位に変換"""
+    byte_spans = []
+    pos, byte_pos = 0, 0
+    for start, end in spans:
+        byte_pos += len(content[pos:start].encode("utf-8"))
+        byte_start = byte_pos
+        byte_pos += len(content[start:end].encode("utf-8"))
+        byte_spans.append((byte_start, byte_pos))
+        pos = end
+    return byte_spans
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """ベクトルをL2正規化（内積 = コサイン類似度にする）"""
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class DocumentIndex:
+    """チャンク単位の埋め込みでドキュメントを検索するクラス"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        """
+        初期化
+
+        Args:
+            model: 使用する埋め込みモデル名
+        """
+        self.model = model
+        self.index: faiss.IndexFlatIP | None = None
+        # (doc_name, sha, byte_start, byte_end)：本文は document_store から読む
+        self.chunks: list[tuple[str, str, int, int]] = []
+
+    def _embed(self, texts: list[str], task_type: str) -> np.ndarray:
+        """テキストをまとめて埋め込み、正規化したベクトルを返す"""
+        result = genai.embed_content(
+            model=self.model, content=texts, task_type=task_type
+        )
+        return _normalize(result["embedding"])
+
+    def add(self, doc_name: str, sha: str, content: str) -> None:
+        """
+        ドキュメントをチャンク分割してインデックスに追加
+
+        Args:
+            doc_name: ドキュメント名
+            sha: document_store に保存した本文のハッシュ
+            content: ドキュメントの内容
+        """
+        self.add_many([(doc_name, sha, content)])
+
+    def add_many(self, documents: list[tuple[str, str, str]]) -> None:
+        """
+        複数ドキュメントのチャンクをまとめて埋め込み、インデックスに追加
+
+        Args:
+            documents: (doc_name, sha, content) のリスト
+        """
+        self.add_embedded(*self.embed_documents(documents))
+
+    def embed_documents(
+        self, documents: list[tuple[str, str, str]]
+    ) -> tuple[list[tuple[str, str, int, int]], np.ndarray | None]:
+        """
+        複数ドキュメントをチャンク分割してまとめて埋め込む（インデックスは変更しない）
+
+        Args:
+            documents: (doc_name, sha, content) のリスト
+
+        Returns:
+            (チャンクのリスト, 正規化済みベクトル)。add_embedded にそのまま渡す
+        """
+        texts = []
+        chunks = []
+        for doc_name, sha, content in documents:
+            spans = split_chunks(content)
+            texts.extend(content[start:end] for start, end in spans)
+            chunks.extend(
+                (doc_name, sha, start, end) for start, end in _byte_spans(content, spans)
+            )
+        if not chunks:
+            return [], None
+
+        # ドキュメント側の埋め込みはディスクキャッシュを経由（未キャッシュ分のみ一括計算）
+        return chunks, _normalize(get_or_compute_many(texts, self.model))
+
+    def add_embedded(
+        self, chunks: list[tuple[str, str, int, int]], vectors: np.ndarray | None
+    ) -> None:
+        """embed_documents の結果をインデックスに追加（APIは呼ばない）"""
+        if not chunks:
+            return
+
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)
+        self.chunks.extend(chunks)
+
+    def remove(self, doc_name: str) -> None:
+        """指定したドキュメントのチャンクを削除"""
+        keep = [chunk[0] != doc_name for chunk in self.chunks]
+        if all(keep):
+            return
+        self.chunks = [c for c, k in zip(self.chunks, keep) if k]
+        if not self.chunks:
+            self.index = None
+            return
+
+        # ベクトルの複製は持たず、インデックス自身から取り出して再構築
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)[np.array(keep)]
+        self.index = faiss.IndexFlatIP(vectors.shape[1])
+        self.index.add(vectors)
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        """チャンクの所属ドキュメント名を付け替え（再埋め込みはしない）"""
+        self.chunks = [
+            (new_name, *chunk[1:]) if chunk[0] == old_name else chunk
+            for chunk in self.chunks
+        ]
+
+    def clear(self) -> None:
+        """インデックスを空にする"""
+        self.index = None
+        self.chunks = []
+
+    def get_chunk(self, i: int) -> tuple[str, str]:
+        """
+        チャンクの本文をディスクから読み込み
+
+        Args:
+            i: search が返したチャンク番号
+
+        Returns:
+            (doc_name, chunk_text)
+        """
+        doc_name, sha, start, end = self.chunks[i]
+        return doc_name, document_store.read_range(sha, start, end)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """質問を埋め込み、正規化したベクトル（1 x dim）を返す"""
+        return self._embed([query], "retrieval_query")
+
+    def search(self, query_vec: np.ndarray, k: int = 8) -> list[int]:
+        """
+        質問に近いチャンクを検索
+
+        Args:
+            query_vec: embed_query で得た質問ベクトル
+            k: 取得するチャンク数
+
+        Returns:
+            チャンク番号のリスト（類似度の高い順、get_chunk で本文を取得）
+        """
+        if self.index is None or not self.chunks:
+            return []
+
+        _, ids = self.index.search(query_vec, min(k, len(self.chunks)))
+        return [int(i) for i in ids[0] if i >= 0]